@@ -2,6 +2,8 @@
 # -*- coding: utf-8 -*-
 
 import re
+import warnings
+from functools import lru_cache, partial
 import bibtexparser
 
 # =========================
@@ -18,12 +20,11 @@ _LATEX_SIMPLE = {
     r"''": "”",
     r"\/": "",              # italic correction
     r"\ensuremath": "",     # remove math wrapper
-    r"\&": "&",
-    r"\%": "%",
-    r"\_": "_",
-    r"\#": "#",
 }
 
+# Escaped special characters: \& \% \_ \# -> drop the backslash.
+_BACKSLASH_ESC_RE = re.compile(r"\\([&%_#])")
+
 # Accent mapping: \'e, \`e, \"o, \~n, \c{c}, \v{c}, etc.
 _ACCENT_MAP = {
     "'": {"a":"á","e":"é","i":"í","o":"ó","u":"ú","y":"ý","A":"Á","E":"É","I":"Í","O":"Ó","U":"Ú","Y":"Ý"},
@@ -41,6 +42,8 @@ _ACCENT_MAP = {
     ".": {"z":"ż","Z":"Ż"},
 }
 _DOTLESS = {"\\i": "ı", "\\j": "ȷ"}
+# _ACCENT_MAP flattened to one lookup keyed by accent + letter, e.g. "'e".
+_ACCENT_FLAT = {acc + ch: v for acc, sub in _ACCENT_MAP.items() for ch, v in sub.items()}
 
 # Common Greek macros
 _GREEK = {
@@ -56,30 +59,44 @@ _GREEK = {
     r"\Phi":"Φ", r"\Psi":"Ψ", r"\Omega":"Ω",
 }
 
-_ACCENT_CMD_RE = re.compile(
-    r"""\\(?P<acc>['"`^~=.Hkvur])\{?(?P<char>\\i|\\j|[A-Za-z])\}?""",
-    flags=re.UNICODE
-)
+# Single pass over every literal macro; longest keys first so that e.g.
+# \varepsilon wins over any shorter prefix.
+_LATEX_TABLE = {**_LATEX_SIMPLE, **_GREEK}
+_LATEX_RE = re.compile("|".join(re.escape(k) for k in sorted(_LATEX_TABLE, key=len, reverse=True)))
+
+def _replace_macros(s: str) -> str:
+    """Replace _LATEX_TABLE keys in s, leftmost-longest and non-overlapping."""
+    return _LATEX_RE.sub(lambda m: _LATEX_TABLE[m.group(0)], s)
+
+# Characters that can start anything latex_to_unicode rewrites; strings
+# without any of them only need whitespace normalisation.
+_LATEX_TRIGGERS = frozenset('\\{}$`\'"')
+# Math delimiters and grouping braces are dropped once macros are resolved.
+_STRIP_TABLE = str.maketrans("", "", "${}")
+
+# \'{e} or \'e: the braced and bare forms are separate alternatives so the
+# engine never has to guess whether a brace is present. The closing brace is
+# optional so that unbalanced input like \'{e still decodes.
+_ACCENT_CMD_RE = re.compile(r"\\(['\"`^~=.Hkvur])(?:\{(\\i|\\j|[A-Za-z])\}?|(\\i|\\j|[A-Za-z]))")
 
 def _apply_accent(m):
-    acc = m.group("acc")
-    ch  = m.group("char")
+    acc = m.group(1)
+    ch  = m.group(2) or m.group(3)
     ch  = _DOTLESS.get(ch, ch)
-    return _ACCENT_MAP.get(acc, {}).get(ch, ch)
+    return _ACCENT_FLAT.get(acc + ch, ch)
 
+@lru_cache(maxsize=8192)
 def latex_to_unicode(s: str) -> str:
     """Convert common LaTeX accents, quotes, Greek letters into Unicode."""
     if not s:
         return ""
-    for k, v in _LATEX_SIMPLE.items():
-        s = s.replace(k, v)
+    if not _LATEX_TRIGGERS.intersection(s):
+        return " ".join(s.split())
+    s = _replace_macros(s)
+    s = _BACKSLASH_ESC_RE.sub(r"\1", s)
     s = _ACCENT_CMD_RE.sub(_apply_accent, s)
-    for k, v in _GREEK.items():
-        s = s.replace(k, v)
-    s = s.replace("$", "")
-    s = s.replace("{", "").replace("}", "")
-    s = re.sub(r"\s+", " ", s).strip()
-    return s
+    s = s.translate(_STRIP_TABLE)
+    return " ".join(s.split())
 
 def _clean(s: str) -> str:
     return latex_to_unicode(s) if s else ""
@@ -88,8 +105,10 @@ def _clean(s: str) -> str:
 # Author formatting
 # =========================
 
+_AUTHOR_SEP_RE = re.compile(r"\s+and\s+")
+
 def _split_authors(author_field: str):
-    return [a.strip() for a in author_field.replace("\n", " ").split(" and ") if a.strip()]
+    return [a.strip() for a in _AUTHOR_SEP_RE.split(author_field) if a.strip()]
 
 def _format_author_name(name: str) -> str:
     """
@@ -115,17 +134,12 @@ def _format_author_name(name: str) -> str:
         return f"{firsts} {last}".strip()
 
 def _format_authors(entry):
-    a = entry.get("author") or entry.get("editor") or ""
-    if not a:
-        return ""
-    authors = [_format_author_name(x) for x in _split_authors(a)]
-    return ", ".join(authors)
+    return ", ".join(_format_author_name(x) for x in entry["_authors_list"])
 
 def _first_author(entry):
-    a = entry.get("author") or entry.get("editor") or ""
-    if not a:
-        return ""
-    parts = _split_authors(a)
+    parts = entry["_authors_list"]
+    if not parts:
+        return "", 0
     return _format_author_name(parts[0]), len(parts)
 
 # =========================
@@ -170,6 +184,10 @@ def _repo_id_compact(entry):
         repo = repo.capitalize() if repo.lower() == "arxiv" else repo
     return f"{repo}:{eid}" if eid else repo or "preprint"
 
+_ARXIV_NEW_RE = re.compile(r'^(\d{2})(\d{2})\.(\d{4,5})$')
+_ARXIV_OLD_RE = re.compile(r'^[a-z\-]+\/(\d{2})(\d{2})(\d{3,4})$', re.IGNORECASE)
+_YEAR_RE = re.compile(r"\d{4}")
+
 def _parse_arxiv_yymm(eprint: str):
     """
     Parse arXiv ID to extract (year, month, sequence).
@@ -182,21 +200,21 @@ def _parse_arxiv_yymm(eprint: str):
     eprint = eprint.strip()
 
     # New format
-    m = re.match(r'^(?P<yy>\d{2})(?P<mm>\d{2})\.(?P<seq>\d{4,5})$', eprint)
+    m = _ARXIV_NEW_RE.match(eprint)
     if m:
-        yy = int(m.group("yy"))
-        mm = int(m.group("mm"))
-        seq = int(m.group("seq"))
+        yy = int(m.group(1))
+        mm = int(m.group(2))
+        seq = int(m.group(3))
         year = 2000 + yy
         mm = max(1, min(mm, 12))
         return (year, mm, seq)
 
     # Old format
-    m = re.match(r'^[a-z\-]+\/(?P<yy>\d{2})(?P<mm>\d{2})(?P<seq>\d{3,4})$', eprint, flags=re.IGNORECASE)
+    m = _ARXIV_OLD_RE.match(eprint)
     if m:
-        yy = int(m.group("yy"))
-        mm = int(m.group("mm"))
-        seq = int(m.group("seq"))
+        yy = int(m.group(1))
+        mm = int(m.group(2))
+        seq = int(m.group(3))
         year = 1900 + yy if yy >= 90 else 2000 + yy
         mm = max(1, min(mm, 12))
         return (year, mm, seq)
@@ -205,11 +223,8 @@ def _parse_arxiv_yymm(eprint: str):
 
 def _sort_key_publication(e):
     """Sort by publication year (ascending in key; flip with reverse flag)."""
-    y = _year(e)
-    m = re.search(r"\d{4}", y or "")
-    yi = int(m.group(0)) if m else -1
-    sec = (_clean(e.get("author","") or e.get("editor","") or "") + " " + _clean(e.get("title","") or "")).lower()
-    return (yi, sec)
+    sec = (_clean(e["_authors_raw"]) + " " + _clean(e.get("title","") or "")).lower()
+    return (e["_year_i"], sec)
 
 def _sort_key_preprint(e):
     """Sort by arXiv yymm (ascending in key; flip with reverse flag)."""
@@ -218,11 +233,8 @@ def _sort_key_preprint(e):
         year, month, seq = parsed
         primary = (year, month, seq)
     else:
-        y = _year(e)
-        m = re.search(r"\d{4}", y or "")
-        yi = int(m.group(0)) if m else -1
-        primary = (yi, 0, 0)
-    sec = (_clean(e.get("author","") or e.get("editor","") or "") + " " + _clean(e.get("title","") or "")).lower()
+        primary = (e["_year_i"], 0, 0)
+    sec = (_clean(e["_authors_raw"]) + " " + _clean(e.get("title","") or "")).lower()
     return (*primary, sec)
 
 # =========================
@@ -240,16 +252,16 @@ def _format_article(e):
     doi     = (e.get("doi","") or "").strip()
     url     = (e.get("url","") or "").strip()
 
-    core = f'{authors}. "{title}."'
-    if jt:   core += f" {jt} {year}"
-    elif year: core += f" {year}"
-    if vol:   core += f", {vol}"
-    if num:   core += f"({num})"
-    if pages: core += f": {pages}"
-    core = _ensure_dot(core)
-    if doi: core += f" DOI: {doi}"
-    if url: core += f" URL: {url}"
-    return core
+    parts = [f'{authors}. "{title}."']
+    if jt:   parts.append(f" {jt} {year}")
+    elif year: parts.append(f" {year}")
+    if vol:   parts.append(f", {vol}")
+    if num:   parts.append(f"({num})")
+    if pages: parts.append(f": {pages}")
+    parts = [_ensure_dot("".join(parts))]
+    if doi: parts.append(f" DOI: {doi}")
+    if url: parts.append(f" URL: {url}")
+    return "".join(parts)
 
 def _format_preprint(e):
     authors = _format_authors(e)
@@ -259,12 +271,10 @@ def _format_preprint(e):
     doi     = (e.get("doi","") or "").strip()
     url     = (e.get("url","") or "").strip()
 
-    core = f'{authors}. "{title}." Preprint, {repo_id}'
-    if year: core += f", {year}"
-    core = _ensure_dot(core)
-    if doi: core += f" DOI: {doi}"
-    if url: core += f" URL: {url}"
-    return core
+    parts = [_ensure_dot(f'{authors}. "{title}." Preprint, {repo_id}' + (f", {year}" if year else ""))]
+    if doi: parts.append(f" DOI: {doi}")
+    if url: parts.append(f" URL: {url}")
+    return "".join(parts)
 
 def _format_generic(e):
     authors = _format_authors(e)
@@ -273,12 +283,10 @@ def _format_generic(e):
     doi     = (e.get("doi","") or "").strip()
     url     = (e.get("url","") or "").strip()
 
-    core = f'{authors}. "{title}."'
-    if year: core += f" {year}"
-    core = _ensure_dot(core)
-    if doi: core += f" DOI: {doi}"
-    if url: core += f" URL: {url}"
-    return core
+    parts = [_ensure_dot(f'{authors}. "{title}."' + (f" {year}" if year else ""))]
+    if doi: parts.append(f" DOI: {doi}")
+    if url: parts.append(f" URL: {url}")
+    return "".join(parts)
 
 # =========================
 # Formatters (compact)
@@ -286,7 +294,7 @@ def _format_generic(e):
 
 def _venue_for_compact(e):
     """Pick the best venue string for compact mode (journal > booktitle > publisher > org/institution/howpublished)."""
-    return _clean(
+    raw = (
         e.get("journaltitle")
         or e.get("journal")
         or e.get("booktitle")
@@ -296,6 +304,7 @@ def _venue_for_compact(e):
         or e.get("howpublished")
         or ""
     )
+    return _clean(raw)
 
 def _format_compact_published(e):
     first, n = _first_author(e)
@@ -306,20 +315,21 @@ def _format_compact_published(e):
     num   = _clean(e.get("number",""))
     pages = _clean(e.get("pages",""))
 
-    tail = venue
+    parts = [f"{first}{etal}, {venue}"]
     if year:
-        tail += f" {year}"
-    inner = ""
+        parts.append(f" {year}")
+    inner = []
     if vol:
-        inner += f"{vol}"
+        inner.append(vol)
     if num:
-        inner += f"({num})"
+        inner.append(f"({num})")
     if pages:
-        inner += (": " if inner else ": ") + pages
+        inner.append(f": {pages}")
     if inner:
-        tail += f", {inner}"
+        parts.append(", ")
+        parts.extend(inner)
 
-    return f"{first}{etal}, {tail}".strip()
+    return "".join(parts).strip()
 
 def _format_compact_preprint(e):
     first, n = _first_author(e)
@@ -327,73 +337,174 @@ def _format_compact_preprint(e):
     arx = _repo_id_compact(e)
     return f"{first}{etal}, {arx}".strip()
 
+# Formatters indexed by an entry's '_fmt_kind': 0 preprint, 1 article, 2 other.
+_FULL_FMTS    = (_format_preprint, _format_article, _format_generic)
+_COMPACT_FMTS = (_format_compact_preprint, _format_compact_published, _format_compact_published)
+
 def _format_entry(e, compact=False):
-    if compact:
-        if _is_preprint(e):
-            return _format_compact_preprint(e)
-        return _format_compact_published(e)
-    else:
-        if _is_preprint(e):
-            return _format_preprint(e)
-        et = (e.get("ENTRYTYPE") or "").lower()
-        if et == "article":
-            return _format_article(e)
-        return _format_generic(e)
+    return (_COMPACT_FMTS if compact else _FULL_FMTS)[e["_fmt_kind"]](e)
 
 # =========================
 # Core builder used by print/save
 # =========================
 
-def _build_biblio_lines(
+def _prepare_entry(e):
+    """
+    Resolve, once per entry, the fields that formatters and sort keys share:
+    '_authors_raw', '_authors_list', '_is_preprint', '_fmt_kind' (see _FULL_FMTS)
+    and '_year_i' (-1 if unknown).
+    """
+    e["_authors_raw"] = e.get("author") or e.get("editor") or ""
+    e["_authors_list"] = _split_authors(e["_authors_raw"])
+    e["_is_preprint"] = _is_preprint(e)
+    e["_fmt_kind"] = 0 if e["_is_preprint"] else (1 if (e.get("ENTRYTYPE") or "").lower() == "article" else 2)
+    m = _YEAR_RE.search(_year(e) or "")
+    e["_year_i"] = int(m.group(0)) if m else -1
+    return e
+
+def _format_entries(entries, compact=False):
+    """Lazily format entries in order."""
+    return map(partial(_format_entry, compact=compact), entries)
+
+# Entry types bibtexparser v1 keeps by default (it skips any other type).
+_V1_STANDARD_TYPES = {
+    "article", "book", "booklet", "conference", "inbook", "incollection",
+    "inproceedings", "manual", "mastersthesis", "misc", "phdthesis",
+    "proceedings", "techreport", "unpublished",
+}
+
+# Month macros bibtexparser v1 predefines (common_strings=True).
+_V1_COMMON_STRINGS = {
+    "jan": "January", "feb": "February", "mar": "March", "apr": "April",
+    "may": "May", "jun": "June", "jul": "July", "aug": "August",
+    "sep": "September", "oct": "October", "nov": "November", "dec": "December",
+}
+
+def _split_concat(raw: str):
+    """Split a raw BibTeX value on top-level '#' (outside braces and quotes)."""
+    parts, depth, in_quote, start = [], 0, False, 0
+    for i, c in enumerate(raw):
+        if c == "{":
+            depth += 1
+        elif c == "}":
+            depth -= 1
+        elif c == '"' and depth == 0:
+            in_quote = not in_quote
+        elif c == "#" and depth == 0 and not in_quote:
+            parts.append(raw[start:i])
+            start = i + 1
+    parts.append(raw[start:])
+    return parts
+
+def _expand_value(raw: str, strings, bibfile):
+    """
+    Resolve a raw BibTeX value as v1 does: drop the enclosing braces/quotes of
+    each '#'-joined piece and look bare pieces up in strings (lowercase keys).
+    """
+    out = []
+    for piece in _split_concat(raw):
+        piece = piece.strip()
+        if len(piece) >= 2 and (piece[0], piece[-1]) in {("{", "}"), ('"', '"')}:
+            out.append(piece[1:-1])
+        elif piece.isdigit():
+            out.append(piece)
+        elif piece.lower() in strings:
+            out.append(strings[piece.lower()])
+        else:
+            warnings.warn(f"{bibfile}: undefined string macro {piece!r} kept as is")
+            out.append(piece)
+    return "".join(out)
+
+def _load_entries(bibfile):
+    """
+    Parse a .bib file into a list of v1-style entry dicts
+    (lowercase field names plus 'ENTRYTYPE' and 'ID').
+    Uses the bibtexparser v2 parser when available, v1 otherwise. With v2 only
+    the block splitter is used; @string macros, '#' concatenation and enclosing
+    are resolved here to match v1's defaults (non-standard types skipped,
+    duplicate keys kept, month macros predefined).
+    """
+    if not hasattr(bibtexparser, "parse_file"):
+        with open(bibfile, "r", encoding="utf-8") as f:
+            return bibtexparser.load(f).entries
+
+    from bibtexparser.model import DuplicateBlockKeyBlock, Entry, ParsingFailedBlock, String
+
+    library = bibtexparser.parse_file(bibfile, parse_stack=[], encoding="utf-8")
+    strings = dict(_V1_COMMON_STRINGS)
+    entries = []
+    for block in library.blocks:
+        if isinstance(block, DuplicateBlockKeyBlock):
+            block = block.ignore_error_block  # v1 keeps duplicate keys
+        elif isinstance(block, ParsingFailedBlock):
+            warnings.warn(f"{bibfile}: skipping unparsable block: {block.error!r}")
+            continue
+        if isinstance(block, String):
+            strings[block.key.lower()] = _expand_value(block.value, strings, bibfile)
+            continue
+        if not isinstance(block, Entry):
+            continue
+        etype = block.entry_type.lower()
+        if etype not in _V1_STANDARD_TYPES:
+            continue
+        d = {k.lower(): _expand_value(f.value, strings, bibfile) for k, f in block.fields_dict.items()}
+        d["ENTRYTYPE"] = etype
+        d["ID"] = block.key
+        entries.append(d)
+    return entries
+
+def _iter_grouped_lines(preprints, pubs, compact=False):
+    """Yield the PREPRINTS then PUBLICATIONS sections, with blank lines between entries."""
+    if preprints:
+        yield "PREPRINTS"
+        yield ""
+        for i, line in enumerate(_format_entries(preprints, compact=compact)):
+            yield line
+            if i != len(preprints) - 1:
+                yield ""
+    if pubs:
+        if preprints:
+            yield ""
+        yield "PUBLICATIONS"
+        yield ""
+        for i, line in enumerate(_format_entries(pubs, compact=compact)):
+            yield line
+            if i != len(pubs) - 1:
+                yield ""
+
+def _iter_biblio_lines(
     bibfile,
     order_by="keep_bib",
     reverse=False,
     group_preprints_on_publication=True,
     compact=False,
 ):
-    """Build the list of lines to output, honoring all options."""
-    with open(bibfile, "r", encoding="utf-8") as f:
-        db = bibtexparser.load(f)
-    entries = db.entries
+    """
+    Load and order the entries now, honoring all options, and return an
+    iterator that formats the output lines one at a time.
+    """
+    entries = [_prepare_entry(e) for e in _load_entries(bibfile)]
 
     if order_by == "keep_bib":
         ordered = entries[::-1] if reverse else entries
-        lines = [_format_entry(e, compact=compact) for e in ordered]
+        return _format_entries(ordered, compact=compact)
 
     elif order_by == "preprint_date":
         ordered = sorted(entries, key=_sort_key_preprint, reverse=not reverse)
-        lines = [_format_entry(e, compact=compact) for e in ordered]
+        return _format_entries(ordered, compact=compact)
 
     else:  # publication_date
         if group_preprints_on_publication:
-            preprints = [e for e in entries if _is_preprint(e)]
-            pubs      = [e for e in entries if not _is_preprint(e)]
+            preprints, pubs = [], []
+            for e in entries:
+                (preprints if e["_is_preprint"] else pubs).append(e)
 
             preprints_sorted = sorted(preprints, key=_sort_key_preprint,    reverse=not reverse)
             pubs_sorted      = sorted(pubs,      key=_sort_key_publication, reverse=not reverse)
-
-            lines = []
-            if preprints_sorted:
-                lines.append("PREPRINTS")
-                lines.append("")
-                for i, e in enumerate(preprints_sorted):
-                    lines.append(_format_entry(e, compact=compact))
-                    if i != len(preprints_sorted) - 1:
-                        lines.append("")
-            if pubs_sorted:
-                if lines:
-                    lines.append("")
-                lines.append("PUBLICATIONS")
-                lines.append("")
-                for i, e in enumerate(pubs_sorted):
-                    lines.append(_format_entry(e, compact=compact))
-                    if i != len(pubs_sorted) - 1:
-                        lines.append("")
+            return _iter_grouped_lines(preprints_sorted, pubs_sorted, compact=compact)
         else:
             ordered = sorted(entries, key=_sort_key_publication, reverse=not reverse)
-            lines = [_format_entry(e, compact=compact) for e in ordered]
-
-    return lines
+            return _format_entries(ordered, compact=compact)
 
 # =========================
 # Public API
@@ -410,7 +521,7 @@ def print_biblio(
     """
     Print bibliography (stdout). See save_biblio for parameters.
     """
-    lines = _build_biblio_lines(
+    lines = _iter_biblio_lines(
         bibfile=bibfile,
         order_by=order_by,
         reverse=reverse,
@@ -419,12 +530,12 @@ def print_biblio(
     )
 
     if return_lines:
-        return lines
+        return list(lines)
 
     for i, line in enumerate(lines):
-        print(line)
-        if i < len(lines) - 1:
+        if i:
             print()  # preserve blank lines
+        print(line)
 
 def save_biblio(
     bibfile,
@@ -447,14 +558,22 @@ def save_biblio(
         compact: compact entries (e.g., 'First Author et al., Venue Year, Vol(Issue): Pages'
                  or 'First Author et al., arXiv:ID' for preprints)
     """
-    lines = _build_biblio_lines(
+    lines = _iter_biblio_lines(
         bibfile=bibfile,
         order_by=order_by,
         reverse=reverse,
         group_preprints_on_publication=group_preprints_on_publication,
         compact=compact,
     )
-    # Write with trailing newline and preserved blank lines
+    # Entries are loaded and sorted above, so a bad .bib fails before out_path
+    # is touched. Formatting is streamed after the file is truncated, though:
+    # an error inside a formatter leaves a partially written file.
+    # Trailing newline and blank lines are preserved; no entries -> just "\n".
     with open(out_path, "w", encoding="utf-8") as f:
-        f.write("\n".join(lines))
-        f.write("\n")
\ No newline at end of file
+        wrote = False
+        for line in lines:
+            f.write(line)
+            f.write("\n")
+            wrote = True
+        if not wrote:
+            f.write("\n")
\ No newline at end of file